@@ -1,15 +1,74 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import joblib
-import seaborn as sns
-import matplotlib.pyplot as plt
+import altair as alt
+import os
+import hashlib
+import math
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
 
 # =========================
 # Load Models
 # =========================
+RESULT_COLUMNS = pd.Index(["Time", "SYS (Pa)", "DYS (Pa)", "PV (Pa.s)"])
+
+class OnnxModel:
+    # ONNX Runtime session behind the same predict(X) interface as the sklearn models.
+    # The forests are exported with a float32 "X" input (see export_onnx.py).
+    def __init__(self, path):
+        # Single intra-op thread: the three models already run in parallel on
+        # get_executor()'s pool, and a 2-row batch gains nothing from more threads.
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # sha256 of the .joblib this file was exported from (export_onnx.SOURCE_HASH_KEY)
+        self.source_hash = self.session.get_modelmeta().custom_metadata_map.get("source_joblib_sha256")
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return self.session.run(None, {self.input_name: X})[0].ravel()
+
+@st.cache_resource(show_spinner=False)
+def _load_model_cached(path):
+    # Loaded once per process and shared across reruns/sessions. Exceptions
+    # are not cached, so a failed load is retried on the next rerun.
+    # Prefer the ONNX export next to the .joblib file (compiled tree-ensemble
+    # kernel). Use the sklearn model if onnxruntime or the export is missing,
+    # was exported from a different .joblib (not re-exported after retraining),
+    # or fails to load.
+    # Logged rather than st.*: this runs inside a cached function, before set_page_config.
+    onnx_path = os.path.splitext(path)[0] + ".onnx"
+    if ort is None:
+        logger.warning("%s: onnxruntime is not installed; using sklearn", path)
+    elif not os.path.exists(onnx_path):
+        logger.warning("%s: %s not found; using sklearn", path, onnx_path)
+    else:
+        try:
+            model = OnnxModel(onnx_path)
+            with open(path, "rb") as f:
+                joblib_hash = hashlib.sha256(f.read()).hexdigest()
+            if model.source_hash == joblib_hash:
+                logger.warning("%s: using ONNX Runtime (%s)", path, onnx_path)
+                return model
+            logger.warning("%s: %s was exported from a different .joblib (re-run export_onnx.py); "
+                           "using sklearn", path, onnx_path)
+        except Exception:
+            logger.warning("%s: could not load %s; using sklearn", path, onnx_path, exc_info=True)
+    return joblib.load(path)
+
 def load_model(path):
     try:
-        return joblib.load(path)
+        return _load_model_cached(path)
     except Exception as e:
         st.error(f"Could not load model at {path}: {e}")
         return None
@@ -18,6 +77,50 @@ model_SYS = load_model("GUI_SYS.joblib")
 model_DYS = load_model("GUI_DYS.joblib")
 model_PV = load_model("GUI_PV.joblib")
 
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    # One small pool per process, shared across reruns/sessions.
+    return ThreadPoolExecutor(max_workers=3)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def predict_all(opc, cc, lp, nc, gyp, sb, wb, sp):
+    # Rows are the two time points (Time 0 = 10 min, 1 = 30 min); columns are the
+    # INPUT_SPECS inputs followed by Time (training order); float32 is the ONNX input dtype.
+    input_data = np.asarray([[opc, cc, lp, nc, gyp, sb, wb, sp, 0],
+                             [opc, cc, lp, nc, gyp, sb, wb, sp, 1]], dtype=np.float32)
+
+    # Independent models; both backends release the GIL
+    executor = get_executor()
+    futures = [executor.submit(m.predict, input_data) for m in (model_SYS, model_DYS, model_PV)]
+    sys_preds, dys_preds, pv_preds = [f.result() for f in futures]
+    return [["10 min", sys_preds[0], dys_preds[0], pv_preds[0]],
+            ["30 min", sys_preds[1], dys_preds[1], pv_preds[1]]]
+
+# =========================
+# Charts
+# =========================
+def time_chart(df_results, series, y_title):
+    # Client-side (Vega-Lite) line chart with markers; series maps a result column
+    # to its (legend label, colour). Columns are relabelled before plotting because
+    # Vega-Lite treats the "." in "PV (Pa.s)" as a nested field accessor.
+    labels = [label for label, _ in series.values()]
+    colors = [color for _, color in series.values()]
+    df_long = (
+        df_results.rename(columns={col: label for col, (label, _) in series.items()})
+        .melt(id_vars="Time", value_vars=labels, var_name="Parameter", value_name="Value")
+    )
+    return (
+        alt.Chart(df_long)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("Time:N", title="Time"),
+            y=alt.Y("Value:Q", title=y_title, scale=alt.Scale(zero=False)),
+            color=alt.Color("Parameter:N", scale=alt.Scale(domain=labels, range=colors),
+                            legend=alt.Legend(title=None)),
+        )
+        .properties(height=320)
+    )
+
 # =========================
 # Page Config
 # =========================
@@ -26,8 +129,7 @@ st.set_page_config(page_title="Prediction of Rheological properties", layout="wi
 # =========================
 # Custom Styling (Fonts & Layout)
 # =========================
-st.markdown(
-    """
+CUSTOM_CSS = """
     <style>
         html, body, [class*="css"] {
             font-size: 18px !important;
@@ -62,7 +164,8 @@ st.markdown(
             font-size: 16px !important;
             color: gray;
         }
-        div.stButton > button:first-child {
+        div.stButton > button:first-child,
+        div.stFormSubmitButton button {
             background-color: red;
             color: white;
             font-size: 20px;
@@ -72,9 +175,12 @@ st.markdown(
             height: 50px;
         }
     </style>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+# Emitted on every rerun on purpose: Streamlit removes any element a rerun does not
+# re-emit, so gating this on st.session_state would drop the styling after the first
+# widget interaction.
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # =========================
 # Title
@@ -107,62 +213,55 @@ All input parameters are checked against suggested value ranges. If any paramete
 # =========================
 st.markdown('<div class="step-title">Step 1: Enter Mix Parameters</div>', unsafe_allow_html=True)
 
-# Row 1
-col1, col2, col3 = st.columns(3)
-with col1:
-    opc = st.number_input("OPC (%) [40–100]", min_value=0.0, value=50.0)
-with col2:
-    cc = st.number_input("CC (%) [0–43]", min_value=0.0, value=20.0)
-with col3:
-    lp = st.number_input("LP (%) [0–23]", min_value=0.0, value=10.0)
-
-# Row 2
-col4, col5, col6 = st.columns(3)
-with col4:
-    nc = st.number_input("NC (%) [0–5]", min_value=0.0, value=2.0)
-with col5:
-    gyp = st.number_input("GYP (%) [0–3]", min_value=0.0, value=2.0)
-with col6:
-    sb = st.number_input("S/B [0.5–2.5]", min_value=0.0, value=1.0)
-
-# Row 3
-col7, col8, _ = st.columns([1, 1, 1])
-with col7:
-    wb = st.number_input("W/B [0.4–0.55]", min_value=0.0, value=0.45)
-with col8:
-    sp = st.number_input("SP (%) [0.5–2.5]", min_value=0.0, value=1.0)
+# (name, key, default, recommended low, recommended high); keys match the
+# predict_all() arguments, in training order
+INPUT_SPECS = [
+    ("OPC (%)", "opc", 50.0, 40, 100),
+    ("CC (%)", "cc", 20.0, 0, 43),
+    ("LP (%)", "lp", 10.0, 0, 23),
+    ("NC (%)", "nc", 2.0, 0, 5),
+    ("GYP (%)", "gyp", 2.0, 0, 3),
+    ("S/B", "sb", 1.0, 0.5, 2.5),
+    ("W/B", "wb", 0.45, 0.4, 0.55),
+    ("SP (%)", "sp", 1.0, 0.5, 2.5),
+]
+_LOWS = np.array([low for _, _, _, low, _ in INPUT_SPECS])
+_HIGHS = np.array([high for _, _, _, _, high in INPUT_SPECS])
+
+# Inputs are batched in a form: editing a field does not rerun the script,
+# only pressing the submit button does.
+with st.form("mix_inputs"):
+    # One set of 3 columns, each filled top to bottom in INPUT_SPECS order
+    cols = st.columns(3)
+    inputs = {}
+    for i, (name, key, default, low, high) in enumerate(INPUT_SPECS):
+        with cols[i // 3]:
+            inputs[key] = st.number_input(f"{name} [{low:g}–{high:g}]", min_value=0.0, value=default, key=key)
+
+    submitted = st.form_submit_button("Predict rheological parameters")
 
 # =========================
 # Step 2 – Validation
 # =========================
 st.markdown('<div class="step-title">Step 2: Validate Inputs</div>', unsafe_allow_html=True)
 
-binder_sum = opc + cc + lp + gyp
-if binder_sum != 100:
-    st.error(f"❌ Binder content must equal 100%. Current sum = {binder_sum:.2f}%")
-    st.stop()
-else:
-    st.success("✅ Binder content check passed (sum = 100%).")
-
-ranges = {
-    "OPC (%)": (40, 100, opc),
-    "CC (%)": (0, 43, cc),
-    "LP (%)": (0, 23, lp),
-    "NC (%)": (0, 5, nc),
-    "GYP (%)": (0, 3, gyp),
-    "S/B": (0.5, 2.5, sb),
-    "W/B": (0.4, 0.55, wb),
-    "SP (%)": (0.5, 2.5, sp),
-}
-out_of_range = []
-for param, (low, high, val) in ranges.items():
-    if not (low <= val <= high):
-        out_of_range.append(f"{param} = {val} (allowed: {low}–{high})")
-
-if out_of_range:
-    st.warning("⚠️ Some parameters are outside the recommended ranges:\n" + "\n".join(out_of_range))
-else:
-    st.success("✅ All inputs are within recommended ranges.")
+if submitted:
+    binder_sum = inputs["opc"] + inputs["cc"] + inputs["lp"] + inputs["gyp"]
+    if not math.isclose(binder_sum, 100.0, abs_tol=1e-6):  # tolerate float drift from decimal inputs
+        st.error(f"❌ Binder content must equal 100%. Current sum = {binder_sum:.2f}%")
+        st.stop()
+    else:
+        st.success("✅ Binder content check passed (sum = 100%).")
+
+    vals = np.array([inputs[key] for _, key, _, _, _ in INPUT_SPECS])
+    mask = (vals < _LOWS) | (vals > _HIGHS)
+    out_of_range = [f"{INPUT_SPECS[i][0]} = {vals[i]:g} (allowed: {_LOWS[i]:g}–{_HIGHS[i]:g})"
+                    for i in np.flatnonzero(mask)]
+
+    if out_of_range:
+        st.warning("⚠️ Some parameters are outside the recommended ranges:\n" + "\n".join(out_of_range))
+    else:
+        st.success("✅ All inputs are within recommended ranges.")
 
 # =========================
 # Step 3 – Predictions
@@ -170,72 +269,25 @@ else:
 st.markdown('<div class="step-title">Step 3: Predictions</div>', unsafe_allow_html=True)
 
 if model_SYS and model_DYS and model_PV:
-    if st.button("Predict rheological parameters", key="predict_btn"):
+    if submitted:
         results = []
-        feature_names = ["OPC (%)", "CC (%)", "LP (%)", "NC (%)", "GYP (%)",
-                         "S/B", "W/B", "SP (%)", "Time"]
-
-        for time_val, label in zip([0, 1], ["10 min", "30 min"]):
-            input_values = [opc, cc, lp, nc, gyp, sb, wb, sp, time_val]
-            input_data = pd.DataFrame([input_values], columns=feature_names)
 
-            try:
-                sys_pred = model_SYS.predict(input_data)[0]
-                dys_pred = model_DYS.predict(input_data)[0]
-                pv_pred = model_PV.predict(input_data)[0]
-                results.append([label, sys_pred, dys_pred, pv_pred])
-            except Exception as e:
-                st.error(f"Prediction failed for time={label}: {e}")
+        try:
+            results = predict_all(**inputs)
+        except Exception as e:
+            st.error(f"Prediction failed: {e}")
 
         if results:
-            df_results = pd.DataFrame(results, columns=["Time", "SYS (Pa)", "DYS (Pa)", "PV (Pa.s)"])
+            df_results = pd.DataFrame(results, columns=RESULT_COLUMNS)
 
             st.subheader("Prediction Results")
 
-            # --- Build full HTML table as one string ---
-            table_html = """
-            <style>
-                .rheo-table {
-                    width: 80%;
-                    margin: 0 auto;
-                    border-collapse: collapse;
-                    font-family: Arial, sans-serif;
-                    font-size: 18px;
-                }
-                .rheo-table th {
-                    background-color: DodgerBlue;
-                    color: white;
-                    padding: 12px;
-                    text-align: center;
-                    border: 1px solid #ccc;
-                }
-                .rheo-table td {
-                    padding: 10px;
-                    text-align: center;
-                    border: 1px solid #ccc;
-                }
-                .rheo-table tr:nth-child(even) {
-                    background-color: #f9f9f9;
-                }
-            </style>
-            <table class="rheo-table">
-                <thead>
-                    <tr>
-                        <th>Time</th>
-                        <th>SYS (Pa)</th>
-                        <th>DYS (Pa)</th>
-                        <th>PV (Pa.s)</th>
-                    </tr>
-                </thead>
-                <tbody>
-            """
-
-            for _, row in df_results.iterrows():
-                table_html += f"<tr><td>{row['Time']}</td><td>{row['SYS (Pa)']:.2f}</td><td>{row['DYS (Pa)']:.2f}</td><td>{row['PV (Pa.s)']:.2f}</td></tr>"
-
-            table_html += "</tbody></table>"
-
-            st.markdown(table_html, unsafe_allow_html=True)
+            # --- Results table (Streamlit data grid, formatted to 2 decimals)
+            st.dataframe(
+                df_results.style.format({"SYS (Pa)": "{:.2f}", "DYS (Pa)": "{:.2f}", "PV (Pa.s)": "{:.2f}"}),
+                hide_index=True,
+                width="stretch"
+            )
 
 
             # --- Graphs
@@ -243,24 +295,18 @@ if model_SYS and model_DYS and model_PV:
 
             with col1:
                 st.subheader("Yield Stress vs Time")
-                plt.figure(figsize=(5, 4))
-                sns.lineplot(x="Time", y="SYS (Pa)", data=df_results, marker="o", color="red", label="SYS")
-                sns.lineplot(x="Time", y="DYS (Pa)", data=df_results, marker="s", color="dodgerblue", label="DYS")
-                plt.ylabel("Yield Stress (Pa)")
-                plt.xlabel("Time")
-                plt.legend()
-                st.pyplot(plt)
-                plt.clf()  # Clear plot to avoid overlap
+                st.altair_chart(
+                    time_chart(df_results, {"SYS (Pa)": ("SYS", "red"), "DYS (Pa)": ("DYS", "dodgerblue")},
+                               "Yield Stress (Pa)"),
+                    width="stretch"
+                )
 
             with col2:
                 st.subheader("Plastic Viscosity vs Time")
-                plt.figure(figsize=(5, 4))
-                sns.lineplot(x="Time", y="PV (Pa.s)", data=df_results, marker="o", color="green", label="PV")
-                plt.ylabel("Plastic Viscosity (Pa.s)")
-                plt.xlabel("Time")
-                plt.legend()
-                st.pyplot(plt)
-                plt.clf()  # Clear plot to avoid overlap
+                st.altair_chart(
+                    time_chart(df_results, {"PV (Pa.s)": ("PV", "green")}, "Plastic Viscosity (Pa.s)"),
+                    width="stretch"
+                )
 else:
     st.error("Models could not be loaded. Please check the .joblib files.")
 
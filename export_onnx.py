@@ -0,0 +1,36 @@
+import hashlib
+import joblib
+from skl2onnx import to_onnx
+from skl2onnx.common.data_types import FloatTensorType
+
+# =========================
+# Export trained Random Forests to ONNX
+# =========================
+# Run once after retraining (SYS/DYS/PV notebooks) to refresh the GUI_*.onnx files.
+# The Streamlit app serves these through ONNX Runtime, whose compiled
+# TreeEnsembleRegressor kernel is much faster than sklearn's predict, and falls
+# back to a .joblib model when its .onnx file is missing, was exported from a
+# different .joblib (SOURCE_HASH_KEY mismatch), or fails to load, or when
+# onnxruntime is not installed.
+N_FEATURES = 9  # OPC, CC, LP, NC, GYP, S/B, W/B, SP, Time
+
+# With a float32 input and ai.onnx.ml opset 1, TreeEnsembleRegressor stores split
+# thresholds and leaf values as float32, half the size of sklearn's float64 tree
+# arrays; ~7 significant digits is ample for the rheology targets. Pinning the
+# opsets also keeps the files loadable by older onnxruntime releases.
+TARGET_OPSET = {"": 17, "ai.onnx.ml": 1}
+
+# sha256 of the source .joblib, stored in the ONNX metadata; must match the app
+SOURCE_HASH_KEY = "source_joblib_sha256"
+
+for name in ["SYS", "DYS", "PV"]:
+    with open(f"GUI_{name}.joblib", "rb") as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+    model = joblib.load(f"GUI_{name}.joblib")
+    onx = to_onnx(model, initial_types=[("X", FloatTensorType([None, N_FEATURES]))],
+                  target_opset=TARGET_OPSET)
+    meta = onx.metadata_props.add()
+    meta.key, meta.value = SOURCE_HASH_KEY, source_hash
+    with open(f"GUI_{name}.onnx", "wb") as f:
+        f.write(onx.SerializeToString())
+    print(f"Exported GUI_{name}.joblib -> GUI_{name}.onnx")